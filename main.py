@@ -1,94 +1,464 @@
 import streamlit as st
-import google.generativeai as genai
+from google import genai
+from google.genai import errors, types
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential_jitter
+import asyncio
+import difflib
+import hashlib
+import itertools
+import json
+import queue
+import threading
 import time
-from typing import List, Dict
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import List, Dict, Iterator, Optional, Callable, Tuple
 
-def configure_genai(api_key: str):
-    """Configure Google Generative AI with API key"""
-    try:
-        genai.configure(api_key=api_key)
-        return True
-    except Exception as e:
-        st.error(f"Error configuring Gemini API: {str(e)}")
-        return False
+st.set_page_config(page_title="AI Research Team System", page_icon="🔬", layout="wide")
+
+MODEL_NAME = "gemini-1.5-flash"
+
+# Static agent instructions go in each request's system instruction, ahead of
+# any per-request text, so the request prefix is identical across calls and
+# eligible for the provider's prefix caching. Only the topic, sub-topic or
+# findings are sent as the per-call prompt.
+DECOMPOSER_SYSTEM = (
+    "You are a research decomposer agent. Break down the research topic you are given into "
+    "3-5 specific, focused sub-topics that would provide comprehensive coverage of the main topic.\n\n"
+    "Return the sub-topics as a JSON array of strings. Each sub-topic should be "
+    "specific and researchable."
+)
+RESEARCH_SYSTEM = (
+    "You are a research agent. Conduct thorough research on the sub-topic you are given and "
+    "provide a detailed, informative paragraph with key facts, statistics, and insights.\n\n"
+    "Provide a comprehensive paragraph (150-250 words) with factual information, current trends, "
+    "and important details about this sub-topic. Focus on accuracy and depth."
+)
+SUMMARIZER_SYSTEM = (
+    "You are a summarizer agent. Create a comprehensive, cohesive research report based on the "
+    "research findings you are given about a topic.\n\n"
+    "Create a well-structured summary report that:\n"
+    "1. Provides an executive summary\n"
+    "2. Integrates all the research findings coherently\n"
+    "3. Highlights key insights and connections between sub-topics\n"
+    "4. Concludes with implications or future considerations\n\n"
+    "The report should be 400-600 words and professionally written."
+)
+
+# Per-call prompt templates, filled in with str.format
+DECOMPOSER_PROMPT = "Topic: {topic}"
+RESEARCH_PROMPT = "Sub-topic: {subtopic}"
+SUMMARIZER_PROMPT = 'Topic: "{topic}"\n\nResearch Findings:\n\n{research_text}'
+
+# Output caps keep the model from running long on decode time, with about
+# double the tokens the requested word counts need (~1.3 tokens per word) so
+# a response that runs a little long still finishes. A response that does hit
+# its cap is never cached, and is shown (not sent on to the summarizer) with a note.
+DECOMPOSER_MAX_TOKENS = 256
+RESEARCH_MAX_TOKENS = 640
+SUMMARIZER_MAX_TOKENS = 1536
+TRUNCATED_NOTE = "\n\n*[Response cut off at the output length limit]*"
+
+# Streamed research text is redrawn every N chunks rather than per chunk,
+# which keeps long streams from flooding the browser with deltas
+STREAM_FLUSH_EVERY = 5
+
+# Every Gemini request in the process shares one event loop, so this caps the
+# requests in flight across all sessions to stay under the API's rate limits
+MAX_CONCURRENT_REQUESTS = 8
+
+# Rate limiting (429) and temporary unavailability (503) are retried with
+# jittered exponential backoff; any other error (bad key, invalid request,
+# network failure) surfaces immediately, in the agent or sub-topic it hit.
+# Streamed calls only send the request when the first chunk is pulled, so that
+# fetch happens inside the retry, before anything is shown.
+RETRYABLE_STATUS_CODES = {429, 503}
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether an exception is a transient Gemini API error worth retrying"""
+    return isinstance(error, errors.APIError) and error.code in RETRYABLE_STATUS_CODES
+
+gemini_retry = retry(
+    retry=retry_if_exception(is_retryable),
+    wait=wait_exponential_jitter(initial=1, max=30),
+    stop=stop_after_attempt(5),
+    reraise=True
+)
+
+# Gemini Batch Mode jobs are polled at this interval until they reach a final state
+BATCH_POLL_SECONDS = 10
+BATCH_SUCCESS_STATES = {"JOB_STATE_SUCCEEDED", "JOB_STATE_PARTIALLY_SUCCEEDED"}
+BATCH_FINAL_STATES = BATCH_SUCCESS_STATES | {"JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"}
 
-def decomposer_agent(topic: str, model) -> List[str]:
+# Bump PROMPT_VERSION whenever a prompt template changes so cached responses
+# generated from the old wording are not served
+PROMPT_VERSION = "v3"
+CACHE_TTL_SECONDS = 24 * 60 * 60
+CACHE_MAX_ENTRIES = 1024
+
+# Past topics whose wording is at least this similar (difflib ratio) to a new
+# topic have their sub-topics researched speculatively while the decomposer runs.
+# The decomposer's output still decides the sub-topics; mispredictions are cancelled.
+SPECULATION_MATCH_CUTOFF = 0.85
+TOPIC_HISTORY_MAX_ENTRIES = 256
+
+# One client is kept per API key so each run is billed to the key that started
+# it; idle keys' clients are dropped after an hour, or when too many are cached
+CLIENT_TTL_SECONDS = 60 * 60
+CLIENT_MAX_ENTRIES = 32
+
+class ResponseCache:
+    """Thread-safe LRU of Gemini response texts with a time-to-live"""
+    
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (stored_at, text)
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def key(system_instruction: str, prompt: str) -> str:
+        """Hashes the model name, prompt template version, system instruction and prompt text"""
+        raw = f"{MODEL_NAME}\x00{PROMPT_VERSION}\x00{system_instruction}\x00{prompt}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    
+    def get(self, system_instruction: str, prompt: str) -> Optional[str]:
+        """Returns the cached response for this prompt, if present and fresh"""
+        key = self.key(system_instruction, prompt)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry[0] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+    
+    def put(self, system_instruction: str, prompt: str, text: str) -> None:
+        """Stores a response, evicting the least recently used entries past the limit"""
+        if not text:
+            return
+        key = self.key(system_instruction, prompt)
+        with self._lock:
+            self._entries[key] = (time.time(), text)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+@st.cache_resource(show_spinner=False)
+def get_response_cache() -> ResponseCache:
+    """Returns the response cache shared by all sessions and reruns"""
+    return ResponseCache(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES)
+
+class TopicHistory:
+    """Thread-safe LRU of past topics and the sub-topics they were broken into, with a time-to-live"""
+    
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # topic -> (stored_at, sub-topics)
+        self._lock = threading.Lock()
+    
+    def remember(self, topic: str, subtopics: List[str]) -> None:
+        """Records the sub-topics a topic was decomposed into"""
+        with self._lock:
+            self._entries[topic] = (time.time(), list(subtopics))
+            self._entries.move_to_end(topic)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def predict(self, topic: str) -> List[str]:
+        """Returns the sub-topics of the most similar fresh past topic, or an empty list"""
+        with self._lock:
+            now = time.time()
+            for expired in [past for past, (stored_at, _) in self._entries.items() if now - stored_at > self.ttl]:
+                del self._entries[expired]
+            matches = difflib.get_close_matches(topic, list(self._entries), n=1, cutoff=SPECULATION_MATCH_CUTOFF)
+            if not matches:
+                return []
+            self._entries.move_to_end(matches[0])
+            return list(self._entries[matches[0]][1])
+
+@st.cache_resource(show_spinner=False)
+def get_topic_history() -> TopicHistory:
+    """Returns the topic history shared by all sessions and reruns"""
+    # Same lifetime and case-sensitive keys as the response cache, so predictions
+    # never outlive the decomposer responses they came from
+    return TopicHistory(ttl=CACHE_TTL_SECONDS, max_entries=TOPIC_HISTORY_MAX_ENTRIES)
+
+@st.cache_resource(show_spinner=False)
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Starts a single long-lived event loop in a background thread"""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="gemini-event-loop", daemon=True).start()
+    return loop
+
+@st.cache_resource(show_spinner=False)
+def get_request_semaphore() -> asyncio.Semaphore:
+    """Returns the semaphore bounding concurrent Gemini requests on the shared loop"""
+    return asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+@gemini_retry
+def generate(client: genai.Client, prompt: str, config: types.GenerateContentConfig):
+    """Calls generate_content, retrying transient API errors"""
+    return client.models.generate_content(model=MODEL_NAME, contents=prompt, config=config)
+
+@gemini_retry
+def generate_stream(client: genai.Client, prompt: str, config: types.GenerateContentConfig) -> Iterator:
+    """Starts a streamed generate_content call, retrying transient API errors"""
+    stream = client.models.generate_content_stream(model=MODEL_NAME, contents=prompt, config=config)
+    first = next(stream, None)  # Sends the request
+    return stream if first is None else itertools.chain([first], stream)
+
+async def prepend_async(first, stream):
+    """Yields an already fetched chunk, then the rest of the stream"""
+    yield first
+    async for chunk in stream:
+        yield chunk
+
+@gemini_retry
+async def generate_stream_async(client: genai.Client, prompt: str, config: types.GenerateContentConfig):
+    """Starts a streamed async generate_content call, retrying transient API errors"""
+    stream = await client.aio.models.generate_content_stream(model=MODEL_NAME, contents=prompt, config=config)
+    first = await anext(stream, None)  # Sends the request
+    return stream if first is None else prepend_async(first, stream)
+
+def is_truncated(response) -> bool:
+    """Whether a response, or the last chunk of a stream, stopped at the output token cap"""
+    return bool(response is not None and response.candidates) and \
+        response.candidates[0].finish_reason == types.FinishReason.MAX_TOKENS
+
+def submit_async(coro) -> Future:
+    """Schedules a coroutine on the shared event loop and returns its future"""
+    # A cached client's async connections are bound to the loop they were opened
+    # on, so asyncio.run() per click would break from the second run on ("Event
+    # loop is closed"). Coroutines scheduled here must not call st.*,
+    # since the loop thread has no Streamlit script context; they report progress
+    # as (kind, subtopic, text) tuples on a queue drained with iter_updates().
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+
+def iter_updates(future: Future, updates: queue.Queue) -> Iterator:
+    """Yields items posted to the updates queue until the future has finished"""
+    while True:
+        try:
+            yield updates.get(timeout=0.05)
+        except queue.Empty:
+            if future.done() and updates.empty():
+                return
+
+# Evicted clients are not closed explicitly: a run that is still using one keeps
+# it alive, and its connections are closed once it is garbage collected
+@st.cache_resource(show_spinner=False, ttl=CLIENT_TTL_SECONDS, max_entries=CLIENT_MAX_ENTRIES)
+def get_client(api_key: str) -> genai.Client:
+    """Builds the Gemini client for an API key, once per key"""
+    return genai.Client(api_key=api_key)
+
+def decomposer_agent(topic: str, client: genai.Client) -> List[str]:
     """Breaks the main topic into 3-5 sub-topics"""
     try:
-        prompt = f"""
-        You are a research decomposer agent. Break down the following research topic into 3-5 specific, focused sub-topics that would provide comprehensive coverage of the main topic.
-        
-        Topic: {topic}
-        
-        Return only the sub-topics as a numbered list, nothing else. Each sub-topic should be specific and researchable.
-        """
-        
-        response = model.generate_content(prompt)
-        subtopics = []
+        prompt = DECOMPOSER_PROMPT.format(topic=topic)
         
-        for line in response.text.strip().split('\n'):
-            line = line.strip()
-            if line and (line[0].isdigit() or line.startswith('-') or line.startswith('•')):
-                # Remove numbering and formatting
-                clean_topic = line.split('.', 1)[-1].strip() if '.' in line else line.strip('- •').strip()
-                if clean_topic:
-                    subtopics.append(clean_topic)
+        cache = get_response_cache()
+        text = cache.get(DECOMPOSER_SYSTEM, prompt)
+        if text is None:
+            response = generate(
+                client,
+                prompt,
+                types.GenerateContentConfig(
+                    system_instruction=DECOMPOSER_SYSTEM,
+                    max_output_tokens=DECOMPOSER_MAX_TOKENS,
+                    response_mime_type="application/json",
+                    response_schema=list[str]
+                )
+            )
+            text = response.text or ""
+            subtopics = json.loads(text)
+            cache.put(DECOMPOSER_SYSTEM, prompt, text)  # Only once it parses
+        else:
+            subtopics = json.loads(text)
         
+        # Duplicates would share one result slot and be researched (and billed) twice
+        subtopics = list(dict.fromkeys(subtopic.strip() for subtopic in subtopics if subtopic.strip()))
         return subtopics[:5]  # Ensure max 5 subtopics
         
     except Exception as e:
         st.error(f"Error in DecomposerAgent: {str(e)}")
         return []
 
-def research_agent(subtopic: str, model) -> str:
-    """Researches a specific sub-topic and provides detailed information"""
-    try:
-        prompt = f"""
-        You are a research agent. Conduct thorough research on the following sub-topic and provide a detailed, informative paragraph with key facts, statistics, and insights.
-        
-        Sub-topic: {subtopic}
-        
-        Provide a comprehensive paragraph (150-250 words) with factual information, current trends, and important details about this sub-topic. Focus on accuracy and depth.
-        """
-        
-        response = model.generate_content(prompt)
-        return response.text.strip()
-        
-    except Exception as e:
-        st.error(f"Error researching {subtopic}: {str(e)}")
-        return f"Error occurred while researching {subtopic}"
+async def research_agent(subtopic: str, client: genai.Client,
+                         updates: Optional[queue.Queue] = None) -> Tuple[str, bool]:
+    """Researches a specific sub-topic, streaming partial text to the updates queue.
+    Returns the text and whether it was cut off at the output token cap."""
+    prompt = RESEARCH_PROMPT.format(subtopic=subtopic)
+    
+    cache = get_response_cache()
+    cached = cache.get(RESEARCH_SYSTEM, prompt)
+    if cached is not None:
+        return cached, False
+    
+    chunks = []
+    chunk = None
+    async with get_request_semaphore():
+        response = await generate_stream_async(
+            client,
+            prompt,
+            types.GenerateContentConfig(system_instruction=RESEARCH_SYSTEM, max_output_tokens=RESEARCH_MAX_TOKENS)
+        )
+        async for chunk in response:
+            if chunk.text:
+                chunks.append(chunk.text)
+                if updates is not None and len(chunks) % STREAM_FLUSH_EVERY == 0:
+                    updates.put(("partial", subtopic, "".join(chunks)))
+    
+    text = "".join(chunks).strip()
+    if is_truncated(chunk):
+        return text, True
+    cache.put(RESEARCH_SYSTEM, prompt, text)
+    return text, False
 
-def summarizer_agent(topic: str, research_results: Dict[str, str], model) -> str:
-    """Summarizes all research findings into a cohesive report"""
+async def research_all(subtopics: List[str], client: genai.Client, updates: Optional[queue.Queue] = None,
+                       prefetched: Optional[Dict[str, Future]] = None) -> list:
+    """Researches all sub-topics concurrently, returning each (text, truncated) result or exception in order"""
+    prefetched = prefetched or {}
+    
+    async def research_one(subtopic: str):
+        try:
+            if subtopic in prefetched:
+                # Already in flight from speculative research; just wait for it
+                return subtopic, await asyncio.wrap_future(prefetched[subtopic])
+            return subtopic, await research_agent(subtopic, client, updates)
+        except Exception as e:  # Including transport errors, which the SDK raises as-is
+            return subtopic, e
+    
+    results = {}
+    for next_done in asyncio.as_completed([research_one(subtopic) for subtopic in subtopics]):
+        subtopic, result = await next_done
+        results[subtopic] = result
+        if updates is not None:
+            updates.put(("done", subtopic, result))
+    return [results[subtopic] for subtopic in subtopics]
+
+def research_batch(subtopics: List[str], client: genai.Client, on_poll: Callable[[str], None]) -> list:
+    """Researches all sub-topics in one Gemini Batch Mode job, returning each (text, truncated) result or exception in order"""
+    cache = get_response_cache()
+    prompts = [RESEARCH_PROMPT.format(subtopic=subtopic) for subtopic in subtopics]
+    results = [cache.get(RESEARCH_SYSTEM, prompt) for prompt in prompts]
+    pending = [i for i, result in enumerate(results) if result is None]
+    results = [None if result is None else (result, False) for result in results]
+    if not pending:
+        return results
+    
+    job = client.batches.create(
+        model=MODEL_NAME,
+        src=[
+            {
+                "contents": [{"role": "user", "parts": [{"text": prompts[i]}]}],
+                "config": {"system_instruction": RESEARCH_SYSTEM, "max_output_tokens": RESEARCH_MAX_TOKENS},
+            }
+            for i in pending
+        ],
+        config={"display_name": "research-agents"},
+    )
+    while job.state.name not in BATCH_FINAL_STATES:
+        on_poll(job.state.name)
+        time.sleep(BATCH_POLL_SECONDS)
+        job = client.batches.get(name=job.name)
+    
+    if job.state.name not in BATCH_SUCCESS_STATES:
+        raise RuntimeError(f"Batch job {job.name} finished with state {job.state.name}")
+    
+    responses = (job.dest.inlined_responses if job.dest else None) or []
+    if len(responses) != len(pending):
+        # Responses are matched to requests by position, so with any missing
+        # there is no telling which sub-topic each one belongs to
+        for i in pending:
+            results[i] = RuntimeError(f"Batch job {job.name} returned {len(responses)} responses for {len(pending)} requests")
+        return results
+    
+    for i, item in zip(pending, responses):
+        if item.error is not None:
+            results[i] = RuntimeError(item.error.message or str(item.error))
+            continue
+        text = ((item.response.text if item.response else None) or "").strip()
+        if not text:
+            results[i] = RuntimeError(f"Batch job {job.name} returned no text for this sub-topic")
+            continue
+        if is_truncated(item.response):
+            results[i] = text, True
+            continue
+        cache.put(RESEARCH_SYSTEM, prompts[i], text)
+        results[i] = text, False
+    return results
+
+def summarizer_agent(topic: str, research_results: Dict[str, str], client: genai.Client) -> Iterator[str]:
+    """Summarizes all research findings into a cohesive report, yielding text as it streams in"""
     try:
-        research_text = ""
-        for subtopic, research in research_results.items():
-            research_text += f"\n\n**{subtopic}:**\n{research}"
+        research_text = "\n\n".join(
+            f"**{subtopic}:**\n{research}" for subtopic, research in research_results.items()
+        )
         
-        prompt = f"""
-        You are a summarizer agent. Create a comprehensive, cohesive research report based on the following research findings about "{topic}".
+        prompt = SUMMARIZER_PROMPT.format(topic=topic, research_text=research_text)
         
-        Research Findings:{research_text}
-        
-        Create a well-structured summary report that:
-        1. Provides an executive summary
-        2. Integrates all the research findings coherently
-        3. Highlights key insights and connections between sub-topics
-        4. Concludes with implications or future considerations
-        
-        The report should be 400-600 words and professionally written.
-        """
+        cache = get_response_cache()
+        cached = cache.get(SUMMARIZER_SYSTEM, prompt)
+        if cached is not None:
+            yield cached
+            return
         
-        response = model.generate_content(prompt)
-        return response.text.strip()
+        response = generate_stream(
+            client,
+            prompt,
+            types.GenerateContentConfig(system_instruction=SUMMARIZER_SYSTEM, max_output_tokens=SUMMARIZER_MAX_TOKENS)
+        )
+        chunks = []
+        chunk = None
+        for chunk in response:
+            if chunk.text:
+                chunks.append(chunk.text)
+                yield chunk.text
+        if is_truncated(chunk):
+            yield TRUNCATED_NOTE
+            return
+        cache.put(SUMMARIZER_SYSTEM, prompt, "".join(chunks).strip())
         
     except Exception as e:
         st.error(f"Error in SummarizerAgent: {str(e)}")
-        return "Error occurred while creating summary report"
+        yield "Error occurred while creating summary report"
 
-def main():
-    st.set_page_config(page_title="AI Research Team System", page_icon="🔬", layout="wide")
+def show_download_button(topic: str, summary: str):
+    """Renders the Markdown report download button"""
+    st.download_button(
+        label="📥 Download Text Report",
+        data=lambda: f"# Research Report: {topic}\n\n{summary}",  # Built only when clicked
+        file_name=f"research_report_{topic.replace(' ', '_')}.md",
+        mime="text/markdown"
+    )
+
+def show_subtopics(subtopics: List[str]):
+    """Renders the identified sub-topics as one numbered-list element"""
+    st.subheader("📋 Sub-topics Identified")
+    st.markdown("\n".join(f"{i}. {subtopic}" for i, subtopic in enumerate(subtopics, 1)))
+
+def with_truncation_note(research: str, truncated: bool) -> str:
+    """Appends the cut-off note to research text that is about to be displayed"""
+    return research + TRUNCATED_NOTE if truncated else research
+
+def show_report(report: Dict):
+    """Renders a finished research report kept in session state"""
+    show_subtopics(report["subtopics"])
     
+    st.subheader("🔬 Research Results")
+    for subtopic, research in report["research"].items():
+        with st.expander(f"Research: {subtopic}", expanded=True):
+            st.write(with_truncation_note(research, subtopic in report["truncated"]))
+    
+    st.subheader("📊 Final Research Report")
+    st.markdown("---")
+    st.markdown(report["summary"])
+    show_download_button(report["topic"], report["summary"])
+
+def main():
     st.title("🔬 AI Research Team System")
     st.markdown("*Powered by Google Gemini API*")
     
@@ -98,9 +468,11 @@ def main():
         api_key = st.text_input("Enter your Google Gemini API Key:", type="password", placeholder="Your API key here...")
         
         if api_key:
-            if configure_genai(api_key):
+            try:
+                client = get_client(api_key)
                 st.success("✅ API configured successfully!")
-            else:
+            except Exception as e:
+                st.error(f"Error configuring Gemini API: {str(e)}")
                 st.error("❌ Invalid API key")
                 return
         else:
@@ -113,10 +485,19 @@ def main():
             st.markdown("Made with ❤️ by Bhaumik Senwal")
             
             return
+        
+        use_batch_mode = st.toggle(
+            "Use Batch Mode for research",
+            help="Submits all sub-topics as one Gemini batch job at about half the cost. "
+                 "Batch jobs can take minutes or longer to finish, so results are not streamed."
+        )
     
     # Main interface
     st.header("Research Topic Input")
     topic = st.text_input("Enter your research topic:", placeholder="e.g., Artificial Intelligence in Healthcare")
+    topic = " ".join(topic.split())  # Normalize whitespace so equivalent topics build identical prompts
+    
+    report = st.session_state.get("report")
     
     if st.button("🚀 Start Research", type="primary"):
         if not topic:
@@ -124,8 +505,6 @@ def main():
             return
         
         try:
-            model = genai.GenerativeModel('gemini-1.5-flash')
-            
             # Progress tracking
             progress_bar = st.progress(0)
             status_text = st.empty()
@@ -134,62 +513,118 @@ def main():
             status_text.text("🔍 DecomposerAgent: Breaking down the topic...")
             progress_bar.progress(20)
             
-            subtopics = decomposer_agent(topic, model)
+            # Speculatively research the sub-topics a similar past topic was broken into,
+            # so any the decomposer agrees with are already in flight when it returns
+            history = get_topic_history()
+            prefetched = {}
+            if not use_batch_mode:
+                prefetched = {
+                    subtopic: submit_async(research_agent(subtopic, client))
+                    for subtopic in history.predict(topic)
+                }
+            
+            subtopics = decomposer_agent(topic, client)
+            
+            for subtopic, future in prefetched.items():
+                if subtopic not in subtopics:
+                    future.cancel()  # Misprediction
+            prefetched = {subtopic: future for subtopic, future in prefetched.items() if subtopic in subtopics}
             
             if not subtopics:
                 st.error("Failed to decompose the topic. Please try again.")
                 return
             
-            st.subheader("📋 Sub-topics Identified")
-            for i, subtopic in enumerate(subtopics, 1):
-                st.write(f"{i}. {subtopic}")
+            history.remember(topic, subtopics)
+            
+            show_subtopics(subtopics)
             
             # Step 2: Research each sub-topic
             status_text.text("📚 ResearchAgent: Conducting detailed research...")
             progress_bar.progress(40)
             
+            st.subheader("🔬 Research Results")
+            
+            # Every sub-topic's slot exists before any research starts; streamed and
+            # final text then only patch these elements in place
+            statuses = {}
+            placeholders = {}
+            for subtopic in subtopics:
+                statuses[subtopic] = st.status(f"Research: {subtopic}", expanded=True)
+                placeholders[subtopic] = statuses[subtopic].empty()
+            
             research_results = {}
+            truncated = []  # Sub-topics whose research was cut off; only the display notes it
             
-            st.subheader("🔬 Research Results")
+            def show_research_result(subtopic: str, research_result):
+                if isinstance(research_result, Exception):
+                    placeholders[subtopic].error(f"Error researching {subtopic}: {str(research_result)}")
+                    statuses[subtopic].update(state="error")
+                    research_result = f"Error occurred while researching {subtopic}"
+                else:
+                    research_result, was_truncated = research_result
+                    if was_truncated:
+                        truncated.append(subtopic)
+                    placeholders[subtopic].write(with_truncation_note(research_result, was_truncated))
+                    statuses[subtopic].update(state="complete")
+                research_results[subtopic] = research_result
+                progress_bar.progress(40 + int(len(research_results) * 40 / len(subtopics)))
             
-            for i, subtopic in enumerate(subtopics):
-                with st.expander(f"Research: {subtopic}", expanded=True):
-                    with st.spinner(f"Researching {subtopic}..."):
-                        research_result = research_agent(subtopic, model)
-                        research_results[subtopic] = research_result
-                        st.write(research_result)
+            if use_batch_mode:
+                def show_batch_state(state: str):
+                    status_text.text(f"📚 ResearchAgent: Batch job {state.replace('JOB_STATE_', '').lower()}...")
                 
-                # Update progress
-                progress_value = 40 + (i + 1) * (40 / len(subtopics))
-                progress_bar.progress(int(progress_value))
-                time.sleep(0.5)  # Small delay to show progress
+                with st.spinner(f"Waiting for the batch job researching {len(subtopics)} sub-topics..."):
+                    results = research_batch(subtopics, client, show_batch_state)
+                for subtopic, research_result in zip(subtopics, results):
+                    show_research_result(subtopic, research_result)
+            else:
+                # Each sub-topic is finalized the moment it completes rather than when the slowest does
+                updates = queue.Queue()
+                future = submit_async(research_all(subtopics, client, updates, prefetched))
+                with st.spinner(f"Researching {len(subtopics)} sub-topics in parallel..."):
+                    for kind, subtopic, payload in iter_updates(future, updates):
+                        if kind == "partial":
+                            placeholders[subtopic].markdown(payload + "▌")
+                        else:
+                            show_research_result(subtopic, payload)
+                future.result()
+            
+            # Keep sub-topic order for the summary, whatever order they finished in
+            research_results = {subtopic: research_results[subtopic] for subtopic in subtopics}
+            
+            progress_bar.progress(80)
             
             # Step 3: Summarize findings
             status_text.text("📝 SummarizerAgent: Creating comprehensive report...")
             progress_bar.progress(90)
             
-            with st.spinner("Generating final summary..."):
-                final_summary = summarizer_agent(topic, research_results, model)
+            # Display final summary as it streams in
+            st.subheader("📊 Final Research Report")
+            st.markdown("---")
+            final_summary = st.write_stream(summarizer_agent(topic, research_results, client))
             
             progress_bar.progress(100)
             status_text.text("✅ Research complete!")
             
-            # Display final summary
-            st.subheader("📊 Final Research Report")
-            st.markdown("---")
-            st.markdown(final_summary)
+            st.session_state["report"] = {
+                "topic": topic,
+                "subtopics": subtopics,
+                "research": research_results,
+                "truncated": truncated,
+                "summary": final_summary,
+            }
             
             # Download option
-            st.download_button(
-                label="📥 Download Text Report",
-                data=f"# Research Report: {topic}\n\n{final_summary}",
-                file_name=f"research_report_{topic.replace(' ', '_')}.md",
-                mime="text/markdown"
-            )
+            show_download_button(topic, final_summary)
             
         except Exception as e:
             st.error(f"An error occurred during research: {str(e)}")
             st.info("Please check your API key and try again.")
+    
+    elif report is not None and report["topic"] == topic:
+        # Any other rerun (sidebar edits, download clicks) shows the last finished
+        # report from session state instead of dropping it or calling Gemini again
+        show_report(report)
 
 if __name__ == "__main__":
     main()